@@ -4,8 +4,11 @@ This demonstrates how to use the API from Python code.
 """
 
 import requests
+import httpx
+import asyncio
 import json
 import sys
+import time
 import argparse
 from dotenv import load_dotenv
 import os
@@ -16,7 +19,12 @@ def parse_arguments():
     parser.add_argument("--token", "-t", help="API token for authentication")
     parser.add_argument("--api-url", "-u", help="API base URL (default: http://localhost:8000)")
     parser.add_argument("--model", "-m", default="llama2", help="Model to use (default: llama2)")
-    return parser.parse_args()
+    parser.add_argument("--batch", "-b", metavar="FILE", help="Send every line of FILE as a prompt concurrently instead of chatting")
+    parser.add_argument("--concurrency", "-c", type=int, default=4, help="Maximum concurrent requests in batch mode (default: 4)")
+    args = parser.parse_args()
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    return args
 
 # Load arguments
 args = parse_arguments()
@@ -30,6 +38,13 @@ API_URL = f"{API_BASE}/v1/chat/completions"
 API_TOKEN = args.token or os.environ.get("API_TOKENS", "test-token").split(",")[0]
 DEFAULT_MODEL = args.model
 
+# Reuse one HTTP session so the connection to the API is kept alive between messages
+session = requests.Session()
+session.headers.update({
+    "Content-Type": "application/json",
+    "Authorization": f"Bearer {API_TOKEN}"
+})
+
 def chat_with_llm(prompt, system_message=None, model=DEFAULT_MODEL):
     """
     Send a chat request to the API and return the response.
@@ -49,11 +64,6 @@ def chat_with_llm(prompt, system_message=None, model=DEFAULT_MODEL):
     messages.append({"role": "user", "content": prompt})
     
     # Prepare the request
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {API_TOKEN}"
-    }
-    
     payload = {
         "model": model,
         "messages": messages,
@@ -63,7 +73,7 @@ def chat_with_llm(prompt, system_message=None, model=DEFAULT_MODEL):
     # Send the request
     try:
         print(f"Sending request to {API_URL}...")
-        response = requests.post(API_URL, headers=headers, json=payload, timeout=60)
+        response = session.post(API_URL, json=payload, timeout=60)
         
         if response.status_code == 200:
             result = response.json()
@@ -76,6 +86,62 @@ def chat_with_llm(prompt, system_message=None, model=DEFAULT_MODEL):
         print(f"Exception: {e}")
         return f"Error: {str(e)}"
 
+async def achat(prompt, client, semaphore, system_message=None, model=DEFAULT_MODEL):
+    """
+    Async version of chat_with_llm for sending many prompts at once.
+    
+    Args:
+        prompt (str): The user's message
+        client (httpx.AsyncClient): Shared client, so connections are kept alive
+        semaphore (asyncio.Semaphore): Bounds the number of requests in flight
+        system_message (str, optional): System message to set context
+        model (str, optional): The model to use, defaults to DEFAULT_MODEL
+        
+    Returns:
+        str: The assistant's response
+    """
+    messages = []
+    if system_message:
+        messages.append({"role": "system", "content": system_message})
+    messages.append({"role": "user", "content": prompt})
+    
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": 0.7
+    }
+    
+    async with semaphore:
+        try:
+            response = await client.post(API_URL, json=payload, timeout=60)
+        except Exception as e:
+            return f"Error: {str(e)}"
+    
+    if response.status_code == 200:
+        return response.json()["choices"][0]["message"]["content"]
+    return f"Error: {response.status_code} - {response.text}"
+
+async def batch_chat(prompts_file, concurrency, system_message="You are a helpful assistant.", model=DEFAULT_MODEL):
+    """Send each non-empty line of prompts_file as a prompt, up to concurrency at a time."""
+    with open(prompts_file, encoding="utf-8") as f:
+        prompts = [line.strip() for line in f if line.strip()]
+    
+    print(f"Sending {len(prompts)} prompts to {API_URL} ({concurrency} at a time)...")
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {"Authorization": f"Bearer {API_TOKEN}"}
+    start_time = time.time()
+    async with httpx.AsyncClient(headers=headers) as client:
+        responses = await asyncio.gather(
+            *(achat(prompt, client, semaphore, system_message, model) for prompt in prompts)
+        )
+    elapsed = time.time() - start_time
+    
+    for prompt, response in zip(prompts, responses):
+        print(f"\nYou: {prompt}")
+        print(f"Assistant: {response}")
+    print(f"\nCompleted {len(prompts)} prompts in {elapsed:.2f}s")
+
 def interactive_chat():
     """Start an interactive chat session with the LLM."""
     print("\n" + "="*50)
@@ -121,16 +187,20 @@ def interactive_chat():
 if __name__ == "__main__":
     # Check if the API is running
     try:
-        health_check = requests.get(f"{API_BASE}/health")
+        health_check = session.get(f"{API_BASE}/health", timeout=2.0)
         if health_check.status_code == 200:
             print(f"API is running at {API_BASE}!")
         else:
             print(f"API is not responding correctly at {API_BASE}. Make sure it's running.")
             sys.exit(1)
-    except requests.exceptions.ConnectionError:
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
         print(f"Cannot connect to the API at {API_BASE}. Make sure it's running.")
         print("Start the API with: python run_api.py --start")
         sys.exit(1)
     
-    # Start interactive chat
-    interactive_chat()
+    if args.batch:
+        # Run every prompt in the file concurrently
+        asyncio.run(batch_chat(args.batch, args.concurrency, model=DEFAULT_MODEL))
+    else:
+        # Start interactive chat
+        interactive_chat()
@@ -1,26 +1,263 @@
 import os
+import sys
+import random
+import hashlib
+import asyncio
 import json
 import time
 import uuid
-from typing import List, Optional, Dict, Any, Union
-from datetime import datetime
+import itertools
+from contextvars import ContextVar
+from collections import deque
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import List, Optional, Dict, Any, Tuple, Union
 
 import httpx
+import orjson
+from cachetools import TTLCache
+import tiktoken
 from fastapi import FastAPI, HTTPException, Depends, Header, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from loguru import logger
 
-# Configure logger
-logger.add("api.log", rotation="10 MB", level="INFO")
+# Id of the request being handled, attached to every log record as extra["request_id"]
+request_id_var: ContextVar[Optional[int]] = ContextVar("request_id", default=None)
+
+# Configure logger; enqueue=True hands formatted records to a background thread for writing
+logger.configure(patcher=lambda record: record["extra"].update(request_id=request_id_var.get()))
+logger.remove()
+logger.add(sys.stderr, level="INFO", enqueue=True)
+# Worker processes can't coordinate rotation of a shared file, so each one writes its own
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", "1"))
+LOG_FILE = "api.log" if WEB_CONCURRENCY <= 1 else f"api-{os.getpid()}.log"
+logger.add(LOG_FILE, rotation="10 MB", level="INFO", enqueue=True, serialize=True)
+
+# Fraction of requests whose start/completion lines are logged
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "1.0"))
+
+# Include exception messages in 500 responses; leave off in production
+DEBUG = os.environ.get("DEBUG", "0") == "1"
+
+# Ollama API endpoint
+OLLAMA_API_BASE = os.environ.get("OLLAMA_API_BASE", "http://localhost:11434")
+
+# Shared HTTP client so connections to Ollama are pooled and kept alive across requests
+OLLAMA_CLIENT = httpx.AsyncClient(
+    base_url=OLLAMA_API_BASE,
+    timeout=120.0,
+    limits=httpx.Limits(max_keepalive_connections=64, max_connections=128, keepalive_expiry=85),
+)
+
+# Number of requests Ollama serves in parallel
+OLLAMA_NUM_PARALLEL = int(os.environ.get("OLLAMA_NUM_PARALLEL", "4"))
+
+# Admission control for calls to Ollama; the limit starts at OLLAMA_NUM_PARALLEL.
+# These are totals for the server and are divided between WEB_CONCURRENCY workers.
+OLLAMA_MIN_CONCURRENCY = int(os.environ.get("OLLAMA_MIN_CONCURRENCY", "1"))
+OLLAMA_MAX_CONCURRENCY = int(os.environ.get("OLLAMA_MAX_CONCURRENCY", "32"))
+OLLAMA_LATENCY_TARGET_MS = float(os.environ.get("OLLAMA_LATENCY_TARGET_MS", "10000"))
+
+class ConcurrencyLimiter:
+    """Limit in-flight Ollama calls with an AIMD controller driven by latency and errors.
+
+    While the smoothed latency stays under the target and every slot is in use, each
+    completed call adds `increase / limit`, so the limit grows by about `increase` per
+    round trip as in TCP congestion avoidance. When latency exceeds the target, or Ollama
+    returns 429/5xx, the limit is multiplied by `decrease` (at most once per latency
+    window, like TCP's once per round trip). A Retry-After header pauses new calls for
+    that long.
+    """
+
+    def __init__(
+        self,
+        min_limit: int,
+        max_limit: int,
+        initial_limit: int,
+        latency_target: float,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        smoothing: float = 0.2,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max(min_limit, max_limit)
+        self.limit = float(min(max(initial_limit, min_limit), self.max_limit))
+        self.latency_target = latency_target
+        self.increase = increase
+        self.decrease = decrease
+        self.smoothing = smoothing
+        self.ewma_latency: Optional[float] = None
+        self.last_decrease = 0.0
+        self.paused_until = 0.0
+        self.in_flight = 0
+        self.waiters: deque = deque()
+
+    async def acquire(self):
+        """Wait for a free slot; slots are handed to waiters in arrival order."""
+        loop = asyncio.get_running_loop()
+        delay = self.paused_until - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        
+        if not self.waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return
+        
+        waiter = loop.create_future()
+        self.waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we were cancelled; pass it on
+                self.in_flight -= 1
+                self._wake()
+            else:
+                self.waiters.remove(waiter)
+            raise
+
+    def release(self, latency: float, response: Optional[httpx.Response] = None, count: bool = True):
+        """Free a slot and adjust the limit; a missing response counts as a failed call.
+
+        Cancelled calls pass count=False so they free their slot without moving the limit.
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        # Only grow a limit that was being used; light traffic says nothing about capacity
+        saturated = self.in_flight + 1 >= int(self.limit)
+        self.in_flight -= 1
+        if not count:
+            if now >= self.paused_until:
+                self._wake()
+            return
+        
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency += self.smoothing * (latency - self.ewma_latency)
+        
+        overloaded = response is None or response.status_code == 429 or response.status_code >= 500
+        if overloaded or self.ewma_latency > self.latency_target:
+            if now - self.last_decrease >= self.ewma_latency:
+                self.limit = max(self.min_limit, self.limit * self.decrease)
+                self.last_decrease = now
+        elif saturated:
+            self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+        
+        retry_after = self._retry_after(response)
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+            loop.call_later(retry_after, self._wake)
+        elif now >= self.paused_until:
+            self._wake()
+
+    def _wake(self):
+        if asyncio.get_running_loop().time() < self.paused_until:
+            return
+        while self.waiters and self.in_flight < int(self.limit):
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    @staticmethod
+    def _retry_after(response: Optional[httpx.Response]) -> Optional[float]:
+        if response is None or response.status_code not in (429, 503):
+            return None
+        try:
+            return float(response.headers.get("retry-after", ""))
+        except ValueError:
+            return None
+
+def per_worker(limit: int) -> int:
+    """Split a server-wide concurrency limit between uvicorn workers, each with its own limiter."""
+    return max(1, limit // WEB_CONCURRENCY)
+
+limiter = ConcurrencyLimiter(
+    per_worker(OLLAMA_MIN_CONCURRENCY),
+    per_worker(OLLAMA_MAX_CONCURRENCY),
+    per_worker(OLLAMA_NUM_PARALLEL),
+    OLLAMA_LATENCY_TARGET_MS / 1000,
+)
+
+async def post_chat(ollama_request: Dict[str, Any]) -> httpx.Response:
+    """Send a non-streaming chat request to Ollama once the limiter admits it."""
+    await limiter.acquire()
+    start = time.monotonic()
+    try:
+        response = await OLLAMA_CLIENT.post("/api/chat", json=ollama_request)
+    except BaseException as e:
+        # Only transport errors say anything about Ollama's load; cancellations just free the slot
+        limiter.release(time.monotonic() - start, count=isinstance(e, httpx.TransportError))
+        raise
+    limiter.release(time.monotonic() - start, response)
+    return response
+
+# Response cache configuration; set RESPONSE_CACHE_REDIS_URL to share the cache through Redis
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "2048"))
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", "600"))
+RESPONSE_CACHE_REDIS_URL = os.environ.get("RESPONSE_CACHE_REDIS_URL")
+
+class ResponseCache:
+    """Cache chat completion responses in memory, or in Redis when a URL is configured."""
+
+    def __init__(self, maxsize: int, ttl: int, redis_url: Optional[str] = None):
+        self.ttl = ttl
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.redis = None
+        if redis_url:
+            import redis.asyncio as redis
+
+            self.redis = redis.from_url(redis_url)
+
+    @staticmethod
+    def make_key(payload: Dict[str, Any]) -> str:
+        return hashlib.blake2b(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.redis is None:
+            return self.memory.get(key)
+        try:
+            value = await self.redis.get(f"chatcmpl:{key}")
+        except Exception as e:
+            logger.warning("Response cache lookup failed: {}", e)
+            return None
+        return json.loads(value) if value else None
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        if self.redis is None:
+            self.memory[key] = value
+            return
+        try:
+            await self.redis.set(f"chatcmpl:{key}", json.dumps(value), ex=self.ttl)
+        except Exception as e:
+            logger.warning("Response cache store failed: {}", e)
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.close()
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_REDIS_URL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the tokenizer in a worker thread; token counts are estimated until it is ready
+    asyncio.get_running_loop().run_in_executor(None, load_encoding)
+    yield
+    await response_cache.close()
+    await OLLAMA_CLIENT.aclose()
+    await logger.complete()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Ollama OpenAI-compatible API",
     description="A FastAPI REST API that wraps the local Ollama LLM and mimics the OpenAI /v1/chat/completions endpoint",
     version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Configure CORS
@@ -28,25 +265,29 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allows all origins
     allow_credentials=True,
-    allow_methods=["*"],  # Allows all methods
-    allow_headers=["*"],  # Allows all headers
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_headers=["authorization", "content-type", "x-use-cache"],
+    max_age=86400,  # Let browsers cache preflight responses for a day
 )
 
 # Security
 security = HTTPBearer()
 
 # Load API tokens from environment or .env file
-API_TOKENS = os.environ.get("API_TOKENS", "test-token").split(",")
-
-# Ollama API endpoint
-OLLAMA_API_BASE = os.environ.get("OLLAMA_API_BASE", "http://localhost:11434")
+API_TOKENS = frozenset(
+    token.strip() for token in os.environ.get("API_TOKENS", "test-token").split(",") if token.strip()
+)
 
 # Models
 class Message(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     role: str
     content: str
 
 class ChatCompletionRequest(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     model: str
     messages: List[Message]
     temperature: Optional[float] = 0.7
@@ -77,6 +318,78 @@ class ChatCompletionResponse(BaseModel):
     choices: List[ChatCompletionResponseChoice]
     usage: Usage
 
+# Token counting; the encoding is loaded off the event loop at startup (see lifespan)
+encoding: Optional[tiktoken.Encoding] = None
+
+def load_encoding():
+    """Load the tokenizer used for usage counts.
+
+    On first use tiktoken downloads the BPE file with a blocking request unless it is
+    already in TIKTOKEN_CACHE_DIR, so this must not run on the event loop.
+    """
+    global encoding
+    try:
+        # Ollama model names are unknown to tiktoken; cl100k_base is a close approximation
+        encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning("Could not load tokenizer, using estimates: {}", e)
+
+def count_tokens(text: str) -> int:
+    """Count the tokens in text, falling back to about 4 chars per token without a tokenizer."""
+    if encoding is None:
+        # Round up so short streamed chunks still count as a token
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+def count_prompt_tokens(request: "ChatCompletionRequest") -> int:
+    return sum(count_tokens(msg.content) for msg in request.messages)
+
+# Ollama payload construction
+@lru_cache(maxsize=256)
+def build_ollama_options(
+    temperature: Optional[float],
+    top_p: Optional[float],
+    max_tokens: Optional[int],
+    stop: Tuple[str, ...],
+) -> Dict[str, Any]:
+    """Return the Ollama options for a sampling signature, shared between requests.
+
+    The returned dict is cached, so callers must not mutate it.
+    """
+    return {
+        "temperature": temperature,
+        "top_p": top_p,
+        **({"num_predict": max_tokens} if max_tokens else {}),
+        **({"stop": list(stop)} if stop else {}),
+    }
+
+def build_ollama_payload(request: ChatCompletionRequest) -> Dict[str, Any]:
+    """Convert an OpenAI-style request to an Ollama /api/chat payload."""
+    # Dumped in one pass by pydantic-core rather than rebuilt message by message in Python
+    messages = request.model_dump(include={"messages"})["messages"]
+    stop = request.stop
+    
+    # Most requests set neither max_tokens nor stop; build their fixed-shape payload directly
+    if not (request.max_tokens or stop):
+        return {
+            "model": request.model,
+            "messages": messages,
+            "stream": bool(request.stream),
+            "options": {"temperature": request.temperature, "top_p": request.top_p},
+        }
+    
+    return {
+        "model": request.model,
+        "messages": messages,
+        "stream": bool(request.stream),
+        "options": build_ollama_options(
+            request.temperature,
+            request.top_p,
+            request.max_tokens,
+            tuple(stop) if isinstance(stop, list) else ((stop,) if stop else ()),
+        ),
+    }
+
 # Authentication dependency
 async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     if credentials.credentials not in API_TOKENS:
@@ -87,85 +400,194 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(secur
         )
     return credentials.credentials
 
+# Sequential ids to correlate the log lines of a request
+request_counter = itertools.count(1)
+
 # Middleware for logging requests and responses
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    request_id = str(uuid.uuid4())
-    logger.info(f"Request {request_id} started: {request.method} {request.url}")
+    request_id = next(request_counter)
+    request_id_var.set(request_id)
+    if LOG_SAMPLE_RATE < 1.0 and random.random() >= LOG_SAMPLE_RATE:
+        return await call_next(request)
     
-    # Try to log the request body
-    try:
-        body = await request.body()
-        if body:
-            logger.info(f"Request {request_id} body: {body.decode()}")
-        request = Request(request.scope, request._receive, request._send)
-    except Exception as e:
-        logger.error(f"Error reading request body: {e}")
+    # Log the body size only; the body itself is left for FastAPI to stream into the request model
+    body_size = request.headers.get("content-length", "0")
+    logger.info("Request {} started: {} {} ({} bytes)", request_id, request.method, request.url, body_size)
     
-    start_time = time.time()
+    start_ns = time.monotonic_ns()
     response = await call_next(request)
-    process_time = time.time() - start_time
+    process_ms = (time.monotonic_ns() - start_ns) / 1e6
     
-    logger.info(f"Request {request_id} completed in {process_time:.4f}s with status {response.status_code}")
+    logger.info("Request {} completed in {:.1f}ms with status {}", request_id, process_ms, response.status_code)
     
     return response
 
+# Error body for unexpected failures; the exception message only reaches clients in DEBUG mode
+def internal_error(exc: Exception) -> Dict[str, Any]:
+    error = {"type": "internal_server_error"}
+    if DEBUG:
+        error["message"] = str(exc)
+    return {"error": error}
+
 # Error handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    logger.error(f"Unhandled exception: {exc}")
+    # Let loguru render the traceback
+    logger.opt(exception=exc).error("Unhandled exception")
     return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-        content={"error": {"message": str(exc), "type": "internal_server_error"}},
+        content=internal_error(exc),
     )
 
-# Health check endpoint
+# Health check endpoint; the body is static so it is serialized once at startup
+HEALTH_BODY = orjson.dumps({"status": "ok"})
+
 @app.get("/health")
 async def health_check():
-    return {"status": "ok", "timestamp": datetime.now().isoformat()}
+    return Response(HEALTH_BODY, media_type="application/json")
+
+# Relay Ollama's streamed chat chunks as OpenAI-style SSE frames
+async def stream_chat_completion(
+    response: httpx.Response,
+    request: ChatCompletionRequest,
+    start: float,
+):
+    completion_id = f"chatcmpl-{str(uuid.uuid4())}"
+    created_time = int(time.time())
+    completion_tokens = 0
+    
+    def sse_chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra) -> bytes:
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created_time,
+            "model": request.model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            **extra,
+        }
+        return b"data: " + orjson.dumps(chunk) + b"\n\n"
+    
+    # A client disconnect cancels the stream; that frees the slot without counting as a sample
+    cancelled = False
+    failed = False
+    try:
+        yield sse_chunk({"role": "assistant"})
+        
+        done = False
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            ollama_chunk = json.loads(line)
+            if "error" in ollama_chunk:
+                # Ollama reports failures mid-stream as an error line; don't finish as a success
+                logger.error("Ollama API error during stream: {}", ollama_chunk["error"])
+                error = {"error": {"message": f"Ollama API error: {ollama_chunk['error']}", "type": "upstream_error"}}
+                yield b"data: " + orjson.dumps(error) + b"\n\n"
+                return
+            content = ollama_chunk.get("message", {}).get("content", "")
+            if content:
+                completion_tokens += count_tokens(content)
+                yield sse_chunk({"content": content})
+            if ollama_chunk.get("done"):
+                done = True
+                break
+        
+        if not done:
+            logger.error("Ollama stream ended before the completion was done")
+            error = {"error": {"message": "Ollama stream ended unexpectedly", "type": "upstream_error"}}
+            yield b"data: " + orjson.dumps(error) + b"\n\n"
+            return
+        
+        prompt_tokens = count_prompt_tokens(request)
+        
+        yield sse_chunk(
+            {},
+            finish_reason="stop",
+            usage={
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        )
+        yield b"data: [DONE]\n\n"
+    except (asyncio.CancelledError, GeneratorExit):
+        cancelled = True
+        raise
+    except Exception as e:
+        logger.exception("Error streaming chat completion: {}", e)
+        # Ollama dropping the stream counts as a failed call
+        failed = isinstance(e, httpx.TransportError)
+        yield b"data: " + orjson.dumps(internal_error(e)) + b"\n\n"
+    finally:
+        limiter.release(time.monotonic() - start, None if failed else response, count=not cancelled)
+        await response.aclose()
 
 # Chat completions endpoint
 @app.post("/v1/chat/completions", response_model=ChatCompletionResponse)
 async def create_chat_completion(
     request: ChatCompletionRequest,
     token: str = Depends(verify_token),
+    x_use_cache: Optional[str] = Header(None),
 ):
-    logger.info(f"Processing chat completion request for model: {request.model}")
+    logger.info("Processing chat completion request for model: {}", request.model)
     
     try:
-        # Convert OpenAI-style request to Ollama format
-        ollama_request = {
-            "model": request.model,
-            "messages": [{"role": msg.role, "content": msg.content} for msg in request.messages],
-            "stream": False,
-            "options": {
-                "temperature": request.temperature,
-                "top_p": request.top_p,
-            }
-        }
+        # Only deterministic requests (or ones that explicitly opt in) are served from the cache
+        cache_key = None
+        if not request.stream and (request.temperature == 0 or (x_use_cache or "").lower() == "true"):
+            cache_key = ResponseCache.make_key(
+                request.model_dump(include={"model", "messages", "temperature", "top_p", "max_tokens", "stop"})
+            )
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                logger.info("Serving chat completion for model {} from cache", request.model)
+                return ORJSONResponse(
+                    {"id": f"chatcmpl-{str(uuid.uuid4())}", "created": int(time.time()), **cached}
+                )
         
-        if request.max_tokens:
-            ollama_request["options"]["num_predict"] = request.max_tokens
-            
-        if request.stop:
-            ollama_request["options"]["stop"] = request.stop if isinstance(request.stop, list) else [request.stop]
+        # Convert OpenAI-style request to Ollama format
+        ollama_request = build_ollama_payload(request)
         
-        # Call Ollama API
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{OLLAMA_API_BASE}/api/chat",
-                json=ollama_request,
-                timeout=120.0,
-            )
+        # Stream the completion back as server-sent events
+        if request.stream:
+            await limiter.acquire()
+            start = time.monotonic()
+            try:
+                response = await OLLAMA_CLIENT.send(
+                    OLLAMA_CLIENT.build_request("POST", "/api/chat", json=ollama_request),
+                    stream=True,
+                )
+            except BaseException as e:
+                limiter.release(time.monotonic() - start, count=isinstance(e, httpx.TransportError))
+                raise
             
             if response.status_code != 200:
-                logger.error(f"Ollama API error: {response.status_code} {response.text}")
+                await response.aread()
+                await response.aclose()
+                limiter.release(time.monotonic() - start, response)
+                logger.error("Ollama API error: {} {}", response.status_code, response.text)
                 raise HTTPException(
                     status_code=response.status_code,
                     detail=f"Ollama API error: {response.text}",
                 )
             
-            ollama_response = response.json()
+            return StreamingResponse(
+                stream_chat_completion(response, request, start),
+                media_type="text/event-stream",
+            )
+        
+        # Call Ollama API
+        response = await post_chat(ollama_request)
+        
+        if response.status_code != 200:
+            logger.error("Ollama API error: {} {}", response.status_code, response.text)
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=f"Ollama API error: {response.text}",
+            )
+        
+        ollama_response = response.json()
             
         # Convert Ollama response to OpenAI format
         completion_id = f"chatcmpl-{str(uuid.uuid4())}"
@@ -174,46 +596,68 @@ async def create_chat_completion(
         # Extract the assistant's message
         assistant_message = ollama_response.get("message", {})
         
-        # Estimate token counts (this is approximate)
-        prompt_text = "".join([msg.content for msg in request.messages])
-        completion_text = assistant_message.get("content", "")
-        
-        # Very rough token estimation (about 4 chars per token)
-        prompt_tokens = len(prompt_text) // 4
-        completion_tokens = len(completion_text) // 4
+        # Count tokens
+        prompt_tokens = count_prompt_tokens(request)
+        completion_tokens = count_tokens(assistant_message.get("content", ""))
         total_tokens = prompt_tokens + completion_tokens
         
-        return ChatCompletionResponse(
-            id=completion_id,
-            created=created_time,
-            model=request.model,
-            choices=[
-                ChatCompletionResponseChoice(
-                    index=0,
-                    message=Message(
-                        role=assistant_message.get("role", "assistant"),
-                        content=assistant_message.get("content", ""),
-                    ),
-                    finish_reason="stop",
-                )
+        # Build the response as a plain dict; ChatCompletionResponse documents its schema
+        completion = {
+            "object": "chat.completion",
+            "model": request.model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {
+                        "role": assistant_message.get("role", "assistant"),
+                        "content": assistant_message.get("content", ""),
+                    },
+                    "finish_reason": "stop",
+                }
             ],
-            usage=Usage(
-                prompt_tokens=prompt_tokens,
-                completion_tokens=completion_tokens,
-                total_tokens=total_tokens,
-            ),
-        )
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": total_tokens,
+            },
+        }
+        
+        if cache_key is not None:
+            await response_cache.set(cache_key, completion)
+        
+        # Returning the response directly skips response_model validation
+        return ORJSONResponse({"id": completion_id, "created": created_time, **completion})
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.exception(f"Error processing chat completion: {e}")
-        raise HTTPException(
+        logger.exception("Error processing chat completion: {}", e)
+        return ORJSONResponse(
+            internal_error(e),
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error processing chat completion: {str(e)}",
         )
 
 # Run the application
 if __name__ == "__main__":
+    import argparse
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+
+    parser = argparse.ArgumentParser(description="Run the Ollama OpenAI-compatible API")
+    parser.add_argument("--dev", action="store_true", help="Run a single worker with auto-reload for development")
+    args = parser.parse_args()
+
+    if args.dev:
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    else:
+        workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+        # Workers read WEB_CONCURRENCY to pick their log file and share of the Ollama limits
+        os.environ["WEB_CONCURRENCY"] = str(workers)
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=8000,
+            workers=workers,
+            loop="auto",
+            http="auto",
+            log_level="warning",
+        )
@@ -1,6 +1,23 @@
 """
 Simple script to run the Ollama OpenAI-compatible API.
 This handles checking dependencies and starting the server.
+
+Throughput tuning:
+    The API starts out sending up to OLLAMA_NUM_PARALLEL requests to Ollama at
+    once (see .env). Ollama only serves them concurrently when the Ollama server
+    itself is started with matching settings, e.g.:
+
+        OLLAMA_NUM_PARALLEL=4 OLLAMA_MAX_LOADED_MODELS=2 ollama serve
+
+    OLLAMA_NUM_PARALLEL is the number of requests each loaded model handles in
+    parallel; OLLAMA_MAX_LOADED_MODELS is how many models may stay in memory at
+    the same time.
+
+    The API's concurrency limits (OLLAMA_NUM_PARALLEL, OLLAMA_MIN_CONCURRENCY,
+    OLLAMA_MAX_CONCURRENCY) are enforced inside each worker process. They are
+    divided by WEB_CONCURRENCY (default 1), with at least one call per worker,
+    so running more workers than OLLAMA_NUM_PARALLEL sends more calls to Ollama
+    than it serves in parallel.
 """
 
 import os
@@ -25,7 +42,7 @@ def check_ollama_running():
     """Check if Ollama is running."""
     print("Checking if Ollama is running...")
     try:
-        response = requests.get("http://localhost:11434/api/tags")
+        response = requests.get("http://localhost:11434/api/tags", timeout=2.0)
         if response.status_code == 200:
             models = response.json().get("models", [])
             if models:
@@ -39,7 +56,7 @@ def check_ollama_running():
         else:
             print("❌ Ollama API responded with an error.")
             return False
-    except requests.exceptions.ConnectionError:
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
         print("❌ Ollama is not running. Please start Ollama first.")
         print("   You can download Ollama from: https://ollama.ai/")
         return False
@@ -66,8 +83,13 @@ def setup_virtual_env():
     subprocess.run([str(pip_path), "install", "-r", "requirements.txt"], check=True)
     print("✅ Dependencies installed.")
 
-def start_api_server(host="0.0.0.0", port=8000):
-    """Start the FastAPI server."""
+def start_api_server(host="0.0.0.0", port=8000, dev=False):
+    """Start the FastAPI server.
+
+    By default the server runs WEB_CONCURRENCY workers (1 if unset) with uvicorn's
+    fast event loop and HTTP parser (uvloop/httptools where available). With
+    dev=True it runs a single auto-reloading worker instead.
+    """
     print("\n" + "="*50)
     print(f"Starting the Ollama OpenAI-compatible API server on {host}:{port}...")
     print("="*50)
@@ -78,6 +100,21 @@ def start_api_server(host="0.0.0.0", port=8000):
     else:
         uvicorn_path = Path("venv") / "bin" / "uvicorn"
 
+    env = dict(os.environ)
+    if dev:
+        server_options = ["--reload"]
+        env.pop("WEB_CONCURRENCY", None)
+    else:
+        workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+        server_options = [
+            "--workers", str(workers),
+            "--loop", "auto",
+            "--http", "auto",
+            "--log-level", "warning",
+        ]
+        # Workers read WEB_CONCURRENCY to pick their log file and share of the Ollama limits
+        env["WEB_CONCURRENCY"] = str(workers)
+
     # Start the server
     try:
         subprocess.run([
@@ -85,8 +122,8 @@ def start_api_server(host="0.0.0.0", port=8000):
             "main:app",
             "--host", host,
             "--port", str(port),
-            "--reload"
-        ])
+            *server_options,
+        ], env=env)
     except KeyboardInterrupt:
         print("\nServer stopped.")
 
@@ -126,6 +163,7 @@ def main():
     parser.add_argument("--port", "-p", type=int, default=8000, help="Port to run the API on (default: 8000)")
     parser.add_argument("--host", default="0.0.0.0", help="Host to bind the API to (default: 0.0.0.0)")
     parser.add_argument("--start", "-s", action="store_true", help="Start the API server immediately")
+    parser.add_argument("--dev", action="store_true", help="Run a single worker with auto-reload for development")
     args = parser.parse_args()
 
     print("\n" + "="*50)
@@ -147,6 +185,8 @@ def main():
     print("="*50)
     print(f"\nAPI will be available at: http://localhost:{args.port}")
     print(f"API documentation: http://localhost:{args.port}/docs")
+    print("\nFor concurrent requests, start Ollama with OLLAMA_NUM_PARALLEL (and optionally")
+    print("OLLAMA_MAX_LOADED_MODELS) set, matching OLLAMA_NUM_PARALLEL in your .env file.")
     print("\nExample usage:")
     print(f"""
 curl -X POST http://localhost:{args.port}/v1/chat/completions \\
@@ -164,13 +204,13 @@ curl -X POST http://localhost:{args.port}/v1/chat/completions \\
 
     # Start the server if --start flag is provided or ask the user
     if args.start:
-        start_api_server(args.host, args.port)
+        start_api_server(args.host, args.port, args.dev)
     else:
         # Ask user if they want to start the server
         while True:
             choice = input("\nDo you want to start the API server now? (y/n): ").lower()
             if choice in ['y', 'yes']:
-                start_api_server(args.host, args.port)
+                start_api_server(args.host, args.port, args.dev)
                 break
             elif choice in ['n', 'no']:
                 print(f"\nYou can start the server later with: python run_api.py --start --port {args.port}")
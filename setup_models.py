@@ -2,49 +2,79 @@
 Helper script to pull and manage Ollama models for use with XVault API.
 """
 
-import subprocess
 import sys
 import json
 import requests
 import argparse
-from typing import List, Dict, Any
+from functools import lru_cache
+from typing import List, Dict, Any, Optional
+from requests.adapters import HTTPAdapter
+
+# Shared session so repeated calls to Ollama reuse one connection
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+
+@lru_cache(maxsize=1)
+def fetch_models() -> Optional[List[Dict[str, Any]]]:
+    """Fetch the model list from Ollama once per process; None if Ollama is unreachable."""
+    try:
+        response = session.get("http://localhost:11434/api/tags", timeout=2.0)
+        if response.status_code == 200:
+            return response.json().get("models", [])
+        return None
+    except requests.exceptions.RequestException:
+        return None
 
 def check_ollama_running() -> bool:
     """Check if Ollama is running."""
-    try:
-        response = requests.get("http://localhost:11434/api/tags")
-        return response.status_code == 200
-    except requests.exceptions.ConnectionError:
-        return False
+    return fetch_models() is not None
 
 def get_available_models() -> List[Dict[str, Any]]:
     """Get list of available models from Ollama."""
-    try:
-        response = requests.get("http://localhost:11434/api/tags")
-        if response.status_code == 200:
-            return response.json().get("models", [])
-        return []
-    except requests.exceptions.ConnectionError:
-        return []
+    return fetch_models() or []
 
 def pull_model(model_name: str) -> bool:
-    """Pull a model from Ollama."""
+    """Pull a model through Ollama's HTTP API, printing progress as it streams in."""
     print(f"Pulling model: {model_name}...")
     try:
-        result = subprocess.run(
-            ["ollama", "pull", model_name],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        print(result.stdout)
+        with session.post(
+            "http://localhost:11434/api/pull",
+            json={"name": model_name, "stream": True},
+            stream=True,
+            timeout=(2.0, 300.0),
+        ) as response:
+            if response.status_code != 200:
+                print(f"Error pulling model: {response.status_code} {response.text}")
+                return False
+            
+            on_progress_line = False
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                progress = json.loads(line)
+                if "error" in progress:
+                    print(f"\nError pulling model: {progress['error']}")
+                    return False
+                
+                status = progress.get("status", "")
+                total = progress.get("total")
+                completed = progress.get("completed")
+                if total and completed is not None:
+                    # Rewrite the same line while a layer downloads
+                    sys.stdout.write(f"\r{status}: {completed * 100 // total}% ({completed >> 20}/{total >> 20} MB)")
+                    sys.stdout.flush()
+                    on_progress_line = True
+                else:
+                    if on_progress_line:
+                        sys.stdout.write("\n")
+                        on_progress_line = False
+                    print(status)
+        
+        fetch_models.cache_clear()
         return True
-    except subprocess.CalledProcessError as e:
-        print(f"Error pulling model: {e}")
-        print(e.stderr)
-        return False
-    except FileNotFoundError:
-        print("Error: Ollama command not found. Make sure Ollama is installed.")
+    except (requests.exceptions.RequestException, ValueError) as e:
+        # ValueError covers a truncated or non-JSON progress line
+        print(f"\nError pulling model: {e}")
         return False
 
 def list_models() -> None:
@@ -60,11 +90,11 @@ def list_models() -> None:
     print(f"{'Model Name':<20} {'Size':<10} {'Modified Date':<20}")
     print("-" * 60)
     
-    for model in models:
-        name = model.get("name", "Unknown")
-        size = model.get("size", 0) // (1024 * 1024)  # Convert to MB
-        modified = model.get("modified", "Unknown")
-        print(f"{name:<20} {size:>8} MB {modified:<20}")
+    # Build all rows and write them at once; size >> 20 converts bytes to MB
+    sys.stdout.write("\n".join(
+        f"{model.get('name', 'Unknown'):<20} {model.get('size', 0) >> 20:>8} MB {model.get('modified', 'Unknown'):<20}"
+        for model in models
+    ) + "\n")
 
 def recommend_models() -> None:
     """Recommend some popular models to try."""
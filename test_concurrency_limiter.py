@@ -0,0 +1,139 @@
+import asyncio
+from unittest import mock
+
+import httpx
+import pytest
+
+import main
+from main import ConcurrencyLimiter
+
+def make_limiter(initial_limit=4, latency_target=10.0):
+    return ConcurrencyLimiter(1, 32, initial_limit, latency_target)
+
+def make_client(handler):
+    return httpx.AsyncClient(base_url="http://ollama", transport=httpx.MockTransport(handler))
+
+async def ollama_response(status_code=200, headers=None):
+    """Return a response from a mocked Ollama with the given status."""
+    async with make_client(lambda request: httpx.Response(status_code, headers=headers, json={})) as client:
+        return await client.post("/api/chat", json={})
+
+def test_acquire_queues_past_the_limit():
+    async def run():
+        limiter = make_limiter(initial_limit=2)
+        await limiter.acquire()
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+
+        limiter.release(0.1, await ollama_response())
+        await asyncio.wait_for(waiter, 1)
+        assert limiter.in_flight == 2
+
+    asyncio.run(run())
+
+def test_limit_does_not_grow_without_saturation():
+    async def run():
+        limiter = make_limiter()
+        for _ in range(6):
+            await limiter.acquire()
+            limiter.release(0.1, await ollama_response())
+        assert limiter.limit == 4.0
+
+    asyncio.run(run())
+
+def test_limit_grows_about_one_slot_per_round_trip_when_saturated():
+    async def run():
+        limiter = make_limiter()
+        response = await ollama_response()
+        for _ in range(4):
+            await limiter.acquire()
+        # Keep every slot busy for one round trip of four calls
+        for _ in range(4):
+            limiter.release(0.1, response)
+            await limiter.acquire()
+        assert 4.5 < limiter.limit < 5.0
+
+    asyncio.run(run())
+
+def test_server_error_halves_the_limit():
+    async def run():
+        limiter = make_limiter()
+        await limiter.acquire()
+        limiter.release(0.1, await ollama_response(503))
+        assert limiter.limit == 2.0
+
+    asyncio.run(run())
+
+def test_slow_calls_halve_the_limit():
+    async def run():
+        limiter = make_limiter(latency_target=1.0)
+        await limiter.acquire()
+        limiter.release(2.0, await ollama_response())
+        assert limiter.limit == 2.0
+
+    asyncio.run(run())
+
+def test_retry_after_pauses_new_calls():
+    async def run():
+        limiter = make_limiter()
+        loop = asyncio.get_running_loop()
+        await limiter.acquire()
+        limiter.release(0.1, await ollama_response(429, headers={"Retry-After": "0.2"}))
+
+        started = loop.time()
+        await limiter.acquire()
+        assert loop.time() - started >= 0.15
+
+    asyncio.run(run())
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        limiter = make_limiter(initial_limit=1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert not limiter.waiters
+        assert limiter.in_flight == 1
+
+    asyncio.run(run())
+
+def test_cancelled_calls_keep_the_limit():
+    async def slow(request):
+        await asyncio.sleep(10)
+        return httpx.Response(200, json={})
+
+    async def run():
+        limiter = make_limiter()
+        async with make_client(slow) as client:
+            with mock.patch.object(main, "limiter", limiter), mock.patch.object(main, "OLLAMA_CLIENT", client):
+                for _ in range(3):
+                    call = asyncio.create_task(main.post_chat({}))
+                    await asyncio.sleep(0.01)
+                    call.cancel()
+                    with pytest.raises(asyncio.CancelledError):
+                        await call
+        assert limiter.limit == 4.0
+        assert limiter.in_flight == 0
+        assert limiter.ewma_latency is None
+
+    asyncio.run(run())
+
+def test_transport_errors_count_as_failures():
+    def refuse(request):
+        raise httpx.ConnectError("connection refused")
+
+    async def run():
+        limiter = make_limiter()
+        async with make_client(refuse) as client:
+            with mock.patch.object(main, "limiter", limiter), mock.patch.object(main, "OLLAMA_CLIENT", client):
+                with pytest.raises(httpx.ConnectError):
+                    await main.post_chat({})
+        assert limiter.limit == 2.0
+        assert limiter.in_flight == 0
+
+    asyncio.run(run())